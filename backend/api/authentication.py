@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from users.models import User
+
+from .cache import AUTH_VERSION_KEY, bump_cache_version, get_cache_version
+
+PROFILE_FIELDS = tuple(
+    field for field in User._meta.concrete_fields
+    if field.name != 'password' and field.name not in User.COUNTER_FIELDS
+)
+
+
+class TokenCache:
+    """LRU-кэш токенов в памяти процесса с ограниченным сроком жизни.
+
+    Хранит по ключу токена только профиль пользователя без пароля и
+    счётчиков. Другие процессы узнают о выходе или изменении
+    пользователя по версии в общем кэше: она проверяется не чаще раза
+    в TOKEN_CACHE_CHECK_INTERVAL секунд, и при её смене кэш очищается.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.version = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def check_version(self):
+        now = time.monotonic()
+        if self.checked_at is not None and (
+            now - self.checked_at < settings.TOKEN_CACHE_CHECK_INTERVAL
+        ):
+            return
+        version = get_cache_version(AUTH_VERSION_KEY)
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+            self.checked_at = now
+
+    def get(self, key):
+        self.check_version()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, profile = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return profile
+
+    def set(self, key, user_id, profile):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_TIMEOUT,
+                user_id,
+                profile,
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_MAX_ENTRIES:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for key in [
+                key for key, (_, owner_id, _) in self.entries.items()
+                if owner_id == user_id
+            ]:
+                del self.entries[key]
+
+
+token_cache = TokenCache()
+
+
+def forget_token(key):
+    token_cache.delete(key)
+    bump_cache_version(AUTH_VERSION_KEY)
+
+
+def forget_user(user_id):
+    """Сбрасывает закэшированные токены пользователя.
+
+    В этом процессе удаляются только его записи, другие процессы
+    очищают кэш целиком, увидев новую версию.
+    """
+    token_cache.delete_user(user_id)
+    bump_cache_version(AUTH_VERSION_KEY)
+
+
+def profile_of(user):
+    return user._state.db, tuple(
+        field.get_prep_value(field.value_from_object(user))
+        for field in PROFILE_FIELDS
+    )
+
+
+def user_from_profile(profile):
+    """Пользователь из профиля; пароль и счётчики догружаются по запросу."""
+    db, values = profile
+    return User.from_db(
+        db, [field.attname for field in PROFILE_FIELDS], values
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшем в памяти процесса.
+
+    Повторный запрос с тем же токеном не обращается к базе, пока запись
+    не устарела или версия в общем кэше не сменилась.
+    """
+
+    def authenticate_credentials(self, key):
+        profile = token_cache.get(key)
+        if profile is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user.pk, profile_of(user))
+            return user, token
+        user = user_from_profile(profile)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                'Пользователь неактивен или удалён.'
+            )
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+RECIPE_COUNT_VERSION_KEY = 'recipes:count_version'
+CATALOG_VERSION_KEY = 'catalog:version'
+AUTH_VERSION_KEY = 'auth:version'
+STATE_CACHE = 'state'
+
+
+def get_cache_version(key):
+    return caches[STATE_CACHE].get_or_set(key, time.time_ns(), None)
+
+
+def bump_cache_version(key):
+    cache = caches[STATE_CACHE]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def is_cache_shared():
+    """Видят ли версии кэша другие процессы, например gunicorn."""
+    return not isinstance(caches[STATE_CACHE], (LocMemCache, DummyCache))
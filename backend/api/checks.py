@@ -0,0 +1,24 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+SQLITE_RETURNING_VERSION = (3, 35)
+
+
+@register()
+def sqlite_returning_check(app_configs, **kwargs):
+    """Пакетные эндпоинты используют RETURNING, он есть в SQLite с 3.35."""
+    uses_sqlite = any(
+        database['ENGINE'] == 'django.db.backends.sqlite3'
+        for database in settings.DATABASES.values()
+    )
+    if not uses_sqlite or sqlite3.sqlite_version_info >= (
+        SQLITE_RETURNING_VERSION
+    ):
+        return []
+    return [Error(
+        f'Нужен SQLite не ниже 3.35, установлен {sqlite3.sqlite_version}.',
+        hint='Обновите SQLite или используйте PostgreSQL.',
+        id='api.E001',
+    )]
@@ -0,0 +1,111 @@
+import csv
+import json
+import zipfile
+from itertools import chain, groupby
+
+from recipe.models import ShoppingListItem
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ZipStream:
+    """Поток без перемотки: zipfile пишет в него, генератор забирает байты."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def shopping_list_rows(user=None):
+    items = ShoppingListItem.objects.order_by(
+        'user_id', 'ingredient__name'
+    )
+    if user is not None:
+        items = items.filter(user=user)
+    return items.values_list(
+        'user_id',
+        'user__username',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def peek(rows):
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return None
+    return chain([first], rows)
+
+
+def iter_txt(rows):
+    yield 'Список покупок:\n'
+    for *_, name, measurement_unit, amount in rows:
+        yield f'{name} — {amount} {measurement_unit}\n'
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['name', 'amount', 'measurement_unit'])
+    for *_, name, measurement_unit, amount in rows:
+        yield writer.writerow([name, amount, measurement_unit])
+
+
+def iter_json(rows):
+    separator = '['
+    for *_, name, measurement_unit, amount in rows:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'amount': amount,
+                'measurement_unit': measurement_unit,
+            },
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+EXPORT_WRITERS = {
+    'txt': iter_txt,
+    'csv': iter_csv,
+    'json': iter_json,
+}
+
+
+def iter_archive(rows, export_format):
+    """Собирает списки покупок всех пользователей в потоковый zip."""
+    writer = EXPORT_WRITERS[export_format]
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for (user_id, username), user_rows in groupby(
+            rows, key=lambda row: row[:2]
+        ):
+            name = f'{user_id}_{username}.{export_format}'
+            with archive.open(name, 'w') as entry:
+                for chunk in writer(user_rows):
+                    entry.write(chunk.encode('utf-8'))
+                    yield stream.drain()
+    yield stream.drain()
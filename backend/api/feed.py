@@ -0,0 +1,143 @@
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from recipe.models import FeedEntry, Follow, Recipe
+
+BATCH_SIZE = 1000
+
+
+def followed_recipes(user_id, popular):
+    """Последние рецепты авторов, на которых подписан пользователь.
+
+    popular выбирает авторов, чьи рецепты не рассылаются по лентам.
+    """
+    recipes = Recipe.objects.filter(author__following__user_id=user_id)
+    if popular:
+        recipes = recipes.filter(
+            author__followers_count__gte=settings.FEED_FANOUT_LIMIT
+        )
+    else:
+        recipes = recipes.filter(
+            author__followers_count__lt=settings.FEED_FANOUT_LIMIT
+        )
+    return list(recipes.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id'
+    )[:settings.FEED_TIMELINE_LENGTH])
+
+
+def feed_recipe_ids(user_id):
+    """Возвращает id рецептов ленты, от новых к старым.
+
+    Лента хранится в таблице FeedEntry, рецепты популярных авторов
+    подмешиваются при чтении.
+    """
+    timeline = FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-recipe_id'
+    ).values_list('pub_date', 'recipe_id')[:settings.FEED_TIMELINE_LENGTH]
+    recipe_ids = {}
+    for _, recipe_id in heapq.merge(
+        timeline, followed_recipes(user_id, popular=True), reverse=True
+    ):
+        recipe_ids.setdefault(recipe_id)
+        if len(recipe_ids) == settings.FEED_TIMELINE_LENGTH:
+            break
+    return list(recipe_ids)
+
+
+def add_entries(user_ids, recipes):
+    """Дописывает рецепты (дата, id) в ленты и обрезает их до длины.
+
+    Записи вставляются отдельными строками, поэтому одновременные
+    публикации разных авторов не затирают друг друга.
+    """
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id in user_ids
+            for pub_date, recipe_id in recipes
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    trim_timelines(user_ids)
+
+
+def trim_timelines(user_ids):
+    overflowing = FeedEntry.objects.filter(
+        user_id__in=user_ids
+    ).values('user_id').annotate(
+        total=Count('id')
+    ).filter(
+        total__gt=settings.FEED_TIMELINE_LENGTH
+    ).values_list('user_id', flat=True)
+    for user_id in overflowing:
+        entries = FeedEntry.objects.filter(user_id=user_id)
+        pub_date, recipe_id = entries.order_by(
+            '-pub_date', '-recipe_id'
+        ).values_list(
+            'pub_date', 'recipe_id'
+        )[settings.FEED_TIMELINE_LENGTH - 1]
+        entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        ).delete()
+
+
+def author_recipes(author_id):
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pub_date', 'id')[:settings.FEED_TIMELINE_LENGTH])
+
+
+def followers(author_id):
+    return list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+
+
+def push_recipe(recipe):
+    """Рассылает новый рецепт по лентам подписчиков автора."""
+    add_entries(
+        followers(recipe.author_id), [(recipe.pub_date, recipe.id)]
+    )
+
+
+def follow_feed(user_id, author_id):
+    """Добавляет в ленту рецепты автора, на которого подписались."""
+    add_entries([user_id], author_recipes(author_id))
+
+
+def author_became_popular(author_id):
+    """Убирает рецепты автора из лент: теперь они подмешиваются при чтении."""
+    FeedEntry.objects.filter(recipe__author_id=author_id).delete()
+
+
+def author_became_regular(author_id):
+    """Возвращает рецепты автора в ленты подписчиков."""
+    add_entries(followers(author_id), author_recipes(author_id))
+
+
+def rebuild_feeds(user_ids=None):
+    """Собирает ленты заново из подписок."""
+    entries = FeedEntry.objects.all()
+    if user_ids is None:
+        user_ids = Follow.objects.values_list('user_id', flat=True).distinct()
+    else:
+        entries = entries.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        entries.delete()
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date
+                )
+                for user_id in user_ids
+                for pub_date, recipe_id in followed_recipes(
+                    user_id, popular=False
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
@@ -1,15 +1,115 @@
-import base64
+import binascii
+import re
+import tempfile
 import uuid
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
 from rest_framework import serializers
 
+from .images import normalize_image, variant_urls
+
+DATA_URL_HEADER = re.compile(r'data:image/(?P<type>[\w.+-]+);base64,')
+PIXELS_CHECK_SIZE = 64 * 1024
+
+
+def check_pixels(file):
+    """Проверяет число пикселей по заголовку изображения."""
+    file.seek(0)
+    try:
+        image = Image.open(file)
+    except Image.DecompressionBombError:
+        image = None
+    if image is None or (
+        image.size[0] * image.size[1] > settings.IMAGE_MAX_PIXELS
+    ):
+        raise serializers.ValidationError(
+            'Разрешение изображения слишком велико.'
+        )
+    return image
+
+
+def decode_base64_image(data):
+    """Декодирует data URL по частям во временный файл."""
+    header = DATA_URL_HEADER.match(data, 0, 64)
+    if header is None:
+        raise serializers.ValidationError(
+            'Некорректный заголовок изображения.'
+        )
+    image_type = header['type'].lower()
+    if image_type not in settings.IMAGE_ALLOWED_TYPES:
+        raise serializers.ValidationError(
+            'Недопустимый формат изображения.'
+        )
+    start = header.end()
+    encoded_size = (
+        len(data) - start - data.count('\n', start) - data.count('\r', start)
+    )
+    if encoded_size // 4 * 3 > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise serializers.ValidationError(
+            'Размер изображения слишком велик.'
+        )
+    chunk_size = settings.IMAGE_DECODE_CHUNK_SIZE // 4 * 4
+    file = tempfile.SpooledTemporaryFile(
+        max_size=settings.IMAGE_SPOOL_SIZE
+    )
+    pixels_checked = False
+    pending = ''
+    try:
+        for position in range(start, len(data), chunk_size):
+            # Переносы строк сдвигают границы групп по 4 символа, поэтому
+            # неполная группа переходит в следующую часть.
+            chunk = pending + ''.join(
+                data[position:position + chunk_size].split()
+            )
+            usable = len(chunk) // 4 * 4
+            pending = chunk[usable:]
+            file.write(binascii.a2b_base64(chunk[:usable]))
+            if not pixels_checked and file.tell() >= PIXELS_CHECK_SIZE:
+                try:
+                    check_pixels(file)
+                    pixels_checked = True
+                except (OSError, SyntaxError):
+                    pass
+                file.seek(0, 2)
+        file.write(binascii.a2b_base64(pending))
+        image = check_pixels(file)
+        if image.format.lower() != image_type.replace('jpg', 'jpeg'):
+            raise serializers.ValidationError(
+                'Тип изображения не совпадает с заявленным.'
+            )
+        image.verify()
+    except (binascii.Error, OSError, SyntaxError):
+        file.close()
+        raise serializers.ValidationError('Некорректные данные изображения.')
+    except serializers.ValidationError:
+        file.close()
+        raise
+    file.seek(0)
+    return File(file, name=f'{uuid.uuid4()}.{image_type}')
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            name = f"{uuid.uuid4()}.{ext}"
-            data = ContentFile(base64.b64decode(imgstr), name=name)
-        return super().to_internal_value(data)
+        if isinstance(data, str) and data.startswith('data:'):
+            file = decode_base64_image(data)
+        else:
+            file = super().to_internal_value(data)
+        try:
+            return normalize_image(file)
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError(
+                self.error_messages['invalid_image']
+            )
+        finally:
+            file.close()
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return {
+            size: request.build_absolute_uri(url) if request else url
+            for size, url in variant_urls(value).items()
+        }
@@ -1,6 +1,8 @@
+from django.db.models import OuterRef, Subquery, Sum
 from django_filters import rest_framework as filters
 
-from recipe.models import Ingredient, Recipe, Tag
+from recipe.models import Ingredient, Recipe, RecipeSearchTerm, Tag
+from recipe.search import search_terms
 
 
 class RecipeFilter(filters.FilterSet):
@@ -15,10 +17,13 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_in_shopping_cart', 'is_favorited']
+        fields = [
+            'tags', 'author', 'is_in_shopping_cart', 'is_favorited', 'search'
+        ]
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
@@ -36,6 +41,22 @@ class RecipeFilter(filters.FilterSet):
             return queryset.exclude(favorites__user=user)
         return queryset.none()
 
+    def filter_search(self, queryset, name, value):
+        terms = set(search_terms(value))
+        if not terms:
+            return queryset
+        matches = RecipeSearchTerm.objects.filter(term__in=terms)
+        rank = matches.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            rank=Sum('weight')
+        ).values('rank')
+        return queryset.filter(
+            id__in=matches.values('recipe')
+        ).annotate(
+            search_rank=Subquery(rank)
+        ).order_by('-search_rank', *Recipe._meta.ordering)
+
 
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(lookup_expr='istartswith')
@@ -0,0 +1,261 @@
+import os
+import re
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, ImageSequence, UnidentifiedImageError
+
+from recipe.models import Recipe
+from users.models import User
+
+from .cache import STATE_CACHE
+
+RESIZE_CACHE_SIZE_KEY = 'images:resize_cache_size'
+RESIZE_EVICTION_LOCK_KEY = 'images:resize_eviction'
+RESIZE_EVICTION_LOCK_TIMEOUT = 60
+RESIZE_CACHE_LOW_WATERMARK = 0.9
+ORIGINAL_NAME = re.compile(r'[0-9a-f]{64}\.\w+')
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': settings.IMAGE_QUALITY, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': settings.IMAGE_QUALITY},
+}
+
+
+def normalize_image(file):
+    """Ограничивает размеры изображения и пересохраняет его без метаданных.
+
+    У анимированных GIF и WebP сохраняются все кадры.
+    """
+    file.seek(0)
+    image = Image.open(file)
+    image_format = image.format
+    size = (settings.IMAGE_MAX_SIZE, settings.IMAGE_MAX_SIZE)
+    buffer = BytesIO()
+    if getattr(image, 'is_animated', False):
+        if image.n_frames * image.width * image.height > (
+            settings.IMAGE_MAX_PIXELS
+        ):
+            raise Image.DecompressionBombError(
+                'Слишком много кадров в анимации.'
+            )
+        frames = []
+        for frame in ImageSequence.Iterator(image):
+            frame = frame.copy()
+            frame.thumbnail(size)
+            frames.append(frame)
+        frames[0].save(
+            buffer,
+            image_format,
+            save_all=True,
+            append_images=frames[1:],
+            duration=image.info.get('duration', 100),
+            loop=image.info.get('loop', 0),
+            **SAVE_OPTIONS.get(image_format, {})
+        )
+    else:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+        image.save(
+            buffer, image_format, **SAVE_OPTIONS.get(image_format, {})
+        )
+    return ContentFile(buffer.getvalue(), name=file.name)
+
+
+def variant_name(name, size):
+    return f'{name.rsplit(".", 1)[0]}_{size}.webp'
+
+
+def variant_urls(field_file):
+    if not field_file or field_file.name == field_file.field.default:
+        return {}
+    return {
+        size: field_file.storage.url(variant_name(field_file.name, size))
+        for size in settings.IMAGE_VARIANTS
+    }
+
+
+def generate_variants(field_file):
+    """Создаёт уменьшенные копии изображения в формате WebP."""
+    if not field_file or field_file.name == field_file.field.default:
+        return
+    storage = field_file.storage
+    missing = {
+        size: dimensions
+        for size, dimensions in settings.IMAGE_VARIANTS.items()
+        if not storage.exists(variant_name(field_file.name, size))
+    }
+    if not missing:
+        return
+    try:
+        with storage.open(field_file.name, 'rb') as file:
+            image = Image.open(file)
+            image.load()
+    except (OSError, UnidentifiedImageError):
+        return
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    for size, dimensions in missing.items():
+        buffer = BytesIO()
+        ImageOps.fit(image, dimensions).save(
+            buffer, 'WEBP', **SAVE_OPTIONS['WEBP']
+        )
+        storage.save(
+            variant_name(field_file.name, size),
+            ContentFile(buffer.getvalue())
+        )
+
+
+def is_referenced(name):
+    return (
+        Recipe.objects.filter(image=name).exists()
+        or User.objects.filter(avatar=name).exists()
+    )
+
+
+def collect_image(storage, name):
+    """Удаляет файл и его копии, если он не нужен.
+
+    Файл остаётся, пока на него ссылается запись или пока не прошло
+    IMAGE_RELEASE_GRACE с последнего сохранения: загрузка того же
+    содержимого могла ещё не закоммитить ссылку на него. Такие файлы
+    позже удаляет команда collect_images.
+    """
+    with storage.lock():
+        try:
+            if storage.stored_since(name) < settings.IMAGE_RELEASE_GRACE:
+                return False
+        except FileNotFoundError:
+            return False
+        if is_referenced(name):
+            return False
+        storage.delete(name)
+    for size in settings.IMAGE_VARIANTS:
+        storage.delete(variant_name(name, size))
+    for width, height in settings.IMAGE_RESIZE_SIZES:
+        path = resized_path(name, width, height)
+        if os.path.exists(path):
+            os.remove(path)
+    return True
+
+
+def release_image(field_file):
+    """Удаляет файл после коммита, если на него больше никто не ссылается."""
+    if not field_file or field_file.name == field_file.field.default:
+        return
+    name, storage = field_file.name, field_file.storage
+    transaction.on_commit(lambda: collect_image(storage, name))
+
+
+def collect_images():
+    """Удаляет оставшиеся без ссылок файлы и возвращает их число."""
+    collected = 0
+    for field in (Recipe._meta.get_field('image'),
+                  User._meta.get_field('avatar')):
+        storage = field.storage
+        root = storage.path(field.upload_to)
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                if not ORIGINAL_NAME.fullmatch(filename):
+                    continue
+                name = os.path.relpath(
+                    os.path.join(directory, filename), storage.location
+                ).replace(os.sep, '/')
+                collected += collect_image(storage, name)
+    return collected
+
+
+def stored_file(instance, field_name, update_fields=None):
+    """Возвращает файл, записанный в базе до сохранения объекта."""
+    if instance._state.adding or (
+        update_fields is not None and field_name not in update_fields
+    ):
+        return None
+    stored = type(instance).objects.filter(pk=instance.pk).values_list(
+        field_name, flat=True
+    ).first()
+    if not stored or stored == getattr(instance, field_name).name:
+        return None
+    field_file = getattr(instance, field_name)
+    return type(field_file)(instance, field_file.field, stored)
+
+
+def resized_path(name, width, height):
+    return os.path.join(settings.IMAGE_RESIZE_ROOT, f'{width}x{height}', name)
+
+
+def resize_image(field_file, width, height):
+    """Записывает уменьшенную копию в дисковый кэш и возвращает её путь."""
+    path = resized_path(field_file.name, width, height)
+    if os.path.exists(path):
+        return path
+    with field_file.storage.open(field_file.name, 'rb') as file:
+        image = Image.open(file)
+        image_format = image.format
+        image = ImageOps.fit(image, (width, height))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), delete=False
+    ) as temporary:
+        image.save(temporary, image_format, **SAVE_OPTIONS.get(
+            image_format, {}
+        ))
+    os.replace(temporary.name, path)
+    add_to_resize_cache(os.path.getsize(path))
+    return path
+
+
+def add_to_resize_cache(size):
+    """Учитывает новую копию и при переполнении освобождает место.
+
+    Если счётчик размера потерян, размер пересчитывается по диску.
+    """
+    cache = caches[STATE_CACHE]
+    try:
+        total = cache.incr(RESIZE_CACHE_SIZE_KEY, size)
+    except ValueError:
+        total = None
+    if (
+        total is None or total > settings.IMAGE_RESIZE_CACHE_MAX_SIZE
+    ) and cache.add(
+        RESIZE_EVICTION_LOCK_KEY, True, RESIZE_EVICTION_LOCK_TIMEOUT
+    ):
+        try:
+            evict_resized_images()
+        finally:
+            cache.delete(RESIZE_EVICTION_LOCK_KEY)
+
+
+def evict_resized_images():
+    """Удаляет давно запрошенные копии, пока кэш не уменьшится до порога.
+
+    Повторные запросы отдаёт nginx, поэтому давность обращения берётся
+    из atime файла.
+    """
+    entries = []
+    for directory, _, filenames in os.walk(settings.IMAGE_RESIZE_ROOT):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append(
+                (max(stat.st_atime, stat.st_mtime), stat.st_size, path)
+            )
+    total = sum(size for _, size, _ in entries)
+    limit = settings.IMAGE_RESIZE_CACHE_MAX_SIZE * RESIZE_CACHE_LOW_WATERMARK
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    caches[STATE_CACHE].set(RESIZE_CACHE_SIZE_KEY, total, None)
@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from recipe.models import Ingredient
+
+from .cache import CATALOG_VERSION_KEY, get_cache_version
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def trigrams(value):
+    """Разбивает строку на триграммы слов так же, как pg_trgm."""
+    result = set()
+    for word in normalize(value).split():
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class CatalogIndex(ABC):
+    """Индекс справочника ингредиентов в памяти процесса.
+
+    Перестраивается лениво, когда меняется версия справочника в кэше.
+    Версия проверяется не чаще раза в CATALOG_VERSION_CHECK_INTERVAL
+    секунд. build возвращает неизменяемый снимок, который публикуется
+    одним присваиванием, поэтому читатели работают без блокировки.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.snapshot = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def expire(self):
+        """Заставляет проверить версию при следующем обращении."""
+        self.checked_at = None
+
+    def get_snapshot(self):
+        now = time.monotonic()
+        if self.checked_at is not None and (
+            now - self.checked_at < settings.CATALOG_VERSION_CHECK_INTERVAL
+        ):
+            return self.snapshot
+        version = get_cache_version(CATALOG_VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.snapshot = self.build([
+                        {
+                            'id': pk,
+                            'name': name,
+                            'measurement_unit': measurement_unit,
+                        }
+                        for pk, name, measurement_unit
+                        in Ingredient.objects.values_list(
+                            'id', 'name', 'measurement_unit'
+                        )
+                    ])
+                    self.version = version
+        self.checked_at = now
+        return self.snapshot
+
+    @abstractmethod
+    def build(self, ingredients):
+        """Возвращает снимок индекса по списку ингредиентов."""
+
+
+class IngredientPrefixIndex(CatalogIndex):
+
+    def build(self, ingredients):
+        entries = sorted(
+            (normalize(ingredient['name']), ingredient['id'], ingredient)
+            for ingredient in ingredients
+        )
+        return (
+            tuple(key for key, _, _ in entries),
+            tuple(ingredient for _, _, ingredient in entries),
+        )
+
+    def search(self, prefix):
+        keys, ingredients = self.get_snapshot()
+        prefix = normalize(prefix)
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(sys.maxunicode), start)
+        return list(ingredients[start:end])
+
+
+class IngredientTrigramIndex(CatalogIndex):
+
+    def build(self, ingredients):
+        sizes = []
+        postings = defaultdict(list)
+        for position, ingredient in enumerate(ingredients):
+            ingredient_trigrams = trigrams(ingredient['name'])
+            sizes.append(len(ingredient_trigrams))
+            for trigram in ingredient_trigrams:
+                postings[trigram].append(position)
+        return tuple(ingredients), tuple(sizes), dict(postings)
+
+    def search(self, query):
+        ingredients, sizes, postings = self.get_snapshot()
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+        ranked = []
+        for position, count in shared.items():
+            similarity = count / (
+                len(query_trigrams) + sizes[position] - count
+            )
+            if similarity >= settings.INGREDIENT_SEARCH_THRESHOLD:
+                ranked.append((-similarity, position))
+        ranked.sort()
+        return [
+            ingredients[position]
+            for _, position in ranked[:settings.INGREDIENT_SEARCH_LIMIT]
+        ]
+
+
+ingredient_prefix_index = IngredientPrefixIndex()
+ingredient_trigram_index = IngredientTrigramIndex()
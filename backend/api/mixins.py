@@ -0,0 +1,94 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from recipe.models import Follow
+
+from .cache import CATALOG_VERSION_KEY, get_cache_version
+
+CATALOG_CACHE = 'catalog'
+
+
+class CatalogCacheMixin:
+    """Кэширует готовый JSON справочника и отвечает 304 по ETag."""
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def get_catalog_cache_key(self, request):
+        query = sorted(
+            (param, sorted(values))
+            for param, values in request.query_params.lists()
+        )
+        return 'catalog:{}:{}:{}'.format(
+            get_cache_version(CATALOG_VERSION_KEY),
+            request.path,
+            urlencode(query, doseq=True)
+        )
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        cache = caches[CATALOG_CACHE]
+        cache_key = self.get_catalog_cache_key(request)
+        cached = cache.get(cache_key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = JSONRenderer().render(response.data)
+            cached = (content, f'"{hashlib.sha1(content).hexdigest()}"')
+            cache.set(cache_key, cached, settings.CATALOG_CACHE_TIMEOUT)
+        content, etag = cached
+        if_none_match = parse_etags(
+            request.META.get('HTTP_IF_NONE_MATCH', '')
+        )
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+class SubscribedAuthorsMixin:
+    """Передаёт сериализатору подписки только на авторов текущей страницы.
+
+    author_field — атрибут объекта страницы с id автора.
+    """
+
+    author_field = 'id'
+    page_objects = None
+
+    def paginate_queryset(self, queryset):
+        self.page_objects = super().paginate_queryset(queryset)
+        return self.page_objects
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.page_objects is None:
+            return context
+        user = self.request.user
+        author_ids = {
+            getattr(obj, self.author_field) for obj in self.page_objects
+        }
+        if not user.is_authenticated or not author_ids:
+            context['subscribed_ids'] = set()
+        else:
+            context['subscribed_ids'] = set(Follow.objects.filter(
+                user=user,
+                author_id__in=author_ids
+            ).values_list('author_id', flat=True))
+        return context
@@ -1,7 +1,55 @@
+from functools import partial
+from urllib.parse import urlencode
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
+from .cache import RECIPE_COUNT_VERSION_KEY, get_cache_version
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт count из кэша или из статистики PostgreSQL."""
+
+    def __init__(self, *args, cache_key=None, estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is None:
+            if self.estimate:
+                count = self.get_estimated_count()
+            if count is None:
+                count = super().count
+            cache.set(
+                self.cache_key, count, settings.RECIPE_COUNT_CACHE_TIMEOUT
+            )
+        return count
+
+    def get_estimated_count(self):
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [self.object_list.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] <= 0:
+            return None
+        return row[0]
+
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = settings.PAGINATION_PAGE_SIZE
@@ -15,3 +63,67 @@ class CustomPageNumberPagination(PageNumberPagination):
             'previous': self.get_previous_link(),
             'results': data
         })
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pub_date', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        """При поиске курсор сохраняет сортировку по релевантности."""
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank',) + self.ordering
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipePagination(CustomPageNumberPagination):
+    """Постраничная выдача рецептов с режимом курсора по ?cursor=."""
+
+    cursor_pagination_class = RecipeCursorPagination
+    user_scoped_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_query_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        filter_params = self.get_filter_params(request)
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            cache_key=self.get_count_cache_key(request, filter_params),
+            estimate=settings.RECIPE_COUNT_ESTIMATE and not filter_params
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_filter_params(self, request):
+        ignored_params = (
+            self.page_query_param,
+            self.page_size_query_param,
+            self.cursor_pagination_class.cursor_query_param,
+        )
+        return sorted(
+            (param, sorted(values))
+            for param, values in request.query_params.lists()
+            if param not in ignored_params
+        )
+
+    def get_count_cache_key(self, request, filter_params):
+        if any(
+            param in self.user_scoped_params for param, _ in filter_params
+        ):
+            return None
+        return 'recipes:count:{}:{}:{}'.format(
+            get_cache_version(RECIPE_COUNT_VERSION_KEY),
+            request.path,
+            urlencode(filter_params, doseq=True)
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,17 +1,43 @@
 import re
 
 from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers, validators
 
+from recipe import shopping_list, similarity
 from recipe.models import (Favorite, Follow, Ingredient, IngredientsInRecipe,
                            Recipe, ShoppingCart, Tag)
 from users.models import User
 
-from .fields import Base64ImageField
+from .fields import Base64ImageField, ImageVariantsField
 
 
-class UserSerializer(serializers.ModelSerializer):
+class SubscribedMixin:
+    """Проверяет подписку по множеству id авторов из контекста.
+
+    Множество собирает представление для авторов текущей страницы; без
+    него подписка на одного автора проверяется отдельным запросом.
+    """
+
+    def get_is_subscribed(self, obj):
+        request = self.context.get('request')
+        if request is None or not hasattr(request, 'user'):
+            return False
+        if not request.user.is_authenticated:
+            return False
+        subscribed_ids = self.context.get('subscribed_ids')
+        if subscribed_ids is not None:
+            return obj.id in subscribed_ids
+        return Follow.objects.filter(
+            user=request.user,
+            author=obj
+        ).exists()
+
+
+class UserSerializer(SubscribedMixin, serializers.ModelSerializer):
     avatar = Base64ImageField(required=False)
+    is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField(source='avatar')
     recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
@@ -25,20 +51,10 @@ class UserSerializer(serializers.ModelSerializer):
             'password',
             'is_subscribed',
             'avatar',
+            'avatar_variants',
             'recipes_count',
         )
-        extra_kwargs = {
-            'password': {'write_only': True},
-            'is_subscribed': {'read_only': True}}
-
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or not hasattr(request, 'user'):
-            return False
-        user = request.user
-        if user.is_authenticated:
-            return Follow.objects.filter(user=user, author=obj).exists()
-        return False
+        extra_kwargs = {'password': {'write_only': True}}
 
     def get_avatar(self, obj):
         request = self.context.get('request')
@@ -78,15 +94,18 @@ class UserCreateSerializer(serializers.ModelSerializer):
 
 
 class SubscriptionRecipeSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class SubscribeSerializer(SubscribedMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     recipes_count = serializers.IntegerField(read_only=True)
+    avatar_variants = ImageVariantsField(source='avatar')
 
     class Meta:
         model = User
@@ -99,20 +118,19 @@ class SubscribeSerializer(serializers.ModelSerializer):
             'is_subscribed',
             'recipes',
             'recipes_count',
-            'avatar'
+            'avatar',
+            'avatar_variants'
         )
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or not hasattr(request, 'user'):
-            return False
-        user = request.user
-        if user.is_authenticated:
-            return Follow.objects.filter(user=user, author=obj).exists()
-        return False
-
     def get_recipes(self, obj):
         request = self.context.get('request')
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            return SubscriptionRecipeSerializer(
+                recipes_by_author.get(obj.id, []),
+                many=True,
+                context={'request': request}
+            ).data
         recipes_limit = request.query_params.get(
             'recipes_limit',
             settings.PAGINATION_PAGE_SIZE
@@ -130,9 +148,6 @@ class SubscribeSerializer(serializers.ModelSerializer):
         )
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return getattr(obj, 'recipes_count', 0)
-
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -189,6 +204,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = Recipe
@@ -200,6 +216,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'tags',
             'image',
+            'image_variants',
             'author',
             'is_favorited',
             'is_in_shopping_cart'
@@ -207,27 +224,67 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return Favorite.objects.filter(user=user, recipe=obj).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
+        return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context.get('request').user
-        if user.is_authenticated:
-            return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
-        return False
+        if not user.is_authenticated:
+            return False
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
+        return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
     def save_recipe(self, instance, ingredients_data, tags_data):
-        IngredientsInRecipe.objects.filter(recipe=instance).delete()
-        for ingredient in ingredients_data:
-            IngredientsInRecipe.objects.create(
-                recipe=instance,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
+        current = {
+            item.ingredient_id: item
+            for item in IngredientsInRecipe.objects.filter(recipe=instance)
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        deltas = {
+            ingredient_id: amounts.get(ingredient_id, 0) - (
+                current[ingredient_id].amount if ingredient_id in current
+                else 0
             )
+            for ingredient_id in current.keys() | amounts.keys()
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            IngredientsInRecipe.objects.filter(
+                recipe=instance,
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        added = []
+        for ingredient_id, amount in amounts.items():
+            item = current.get(ingredient_id)
+            if item is None:
+                added.append(IngredientsInRecipe(
+                    recipe=instance,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                ))
+            elif item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        IngredientsInRecipe.objects.bulk_update(changed, ['amount'])
+        IngredientsInRecipe.objects.bulk_create(added)
+        if current:
+            shopping_list.change_recipe(instance.id, deltas)
+        if any(deltas.values()) or set(instance.tags.all()) != set(tags_data):
+            similarity.queue_refresh([instance.id])
 
         instance.tags.set(tags_data)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredient_in_recipe', [])
         tags_data = validated_data.pop('tags', [])
@@ -235,6 +292,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         self.save_recipe(recipe, ingredients_data, tags_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredient_in_recipe', [])
         tags_data = validated_data.pop('tags', [])
@@ -287,9 +345,11 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(source='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
     def validate(self, data):
         user = data['user']
@@ -301,6 +361,14 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         return data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_RECIPES
+    )
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorite
@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipe import shopping_list, similarity
+from recipe.counters import change_counter
+from recipe.models import (Favorite, Follow, Ingredient, Recipe,
+                           RecipeSimilarity, ShoppingCart, Tag)
+from recipe.search import index_recipe
+from users.models import User
+
+from .authentication import forget_token, forget_user
+from .cache import (CATALOG_VERSION_KEY, RECIPE_COUNT_VERSION_KEY,
+                    bump_cache_version)
+from .feed import (author_became_popular, author_became_regular,
+                   follow_feed, push_recipe, rebuild_feeds)
+from .images import generate_variants, release_image, stored_file
+from .indexes import ingredient_prefix_index, ingredient_trigram_index
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(sender, instance, update_fields=None, **kwargs):
+    instance._replaced_image = stored_file(instance, 'image', update_fields)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_cache_version(RECIPE_COUNT_VERSION_KEY)
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+        if instance.author.followers_count < settings.FEED_FANOUT_LIMIT:
+            push_recipe(instance)
+    index_recipe(instance)
+    generate_variants(instance.image)
+    release_image(getattr(instance, '_replaced_image', None))
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    similarity.queue_refresh(RecipeSimilarity.objects.filter(
+        similar=instance
+    ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    bump_cache_version(RECIPE_COUNT_VERSION_KEY)
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+    release_image(instance.image)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_cache_version(RECIPE_COUNT_VERSION_KEY)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    bump_cache_version(CATALOG_VERSION_KEY)
+    ingredient_prefix_index.expire()
+    ingredient_trigram_index.expire()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+        change_counter(Recipe, instance.recipe_id, 'carts_count', 1)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+    change_counter(Recipe, instance.recipe_id, 'carts_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+        followers_count = User.objects.values_list(
+            'followers_count', flat=True
+        ).get(pk=instance.author_id)
+        if followers_count == settings.FEED_FANOUT_LIMIT:
+            author_became_popular(instance.author_id)
+        elif followers_count < settings.FEED_FANOUT_LIMIT:
+            follow_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', -1)
+    rebuild_feeds([instance.user_id])
+    followers_count = User.objects.filter(
+        pk=instance.author_id
+    ).values_list('followers_count', flat=True).first()
+    if followers_count == settings.FEED_FANOUT_LIMIT - 1:
+        author_became_regular(instance.author_id)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    instance._replaced_avatar = stored_file(instance, 'avatar', update_fields)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    forget_user(instance.pk)
+    if update_fields is None or 'avatar' in update_fields:
+        generate_variants(instance.avatar)
+        release_image(getattr(instance, '_replaced_avatar', None))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    release_image(instance.avatar)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_token(instance.key)
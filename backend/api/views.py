@@ -1,47 +1,127 @@
-from io import BytesIO
+import posixpath
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum
-from django.http import HttpResponse
+from django.db import IntegrityError, connection, transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipe.models import (Favorite, Follow, Ingredient, Recipe, ShoppingCart,
-                           Tag)
+from recipe import shopping_list
+from recipe.counters import change_counters
+from recipe.models import (Favorite, Follow, Ingredient, Recipe,
+                           RecipeSimilarity, ShoppingCart, Tag)
 
+from .exports import (EXPORT_CONTENT_TYPES, EXPORT_WRITERS, iter_archive, peek,
+                      shopping_list_rows)
+from .feed import feed_recipe_ids
 from .filters import IngredientFilter, RecipeFilter
-from .paginations import CustomPageNumberPagination
+from .images import resize_image
+from .indexes import ingredient_prefix_index, ingredient_trigram_index
+from .mixins import CatalogCacheMixin, SubscribedAuthorsMixin
+from .paginations import CustomPageNumberPagination, RecipePagination
 from .permissions import AdministratorPermission, IsOwnerOrAdminOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (FavoriteSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          RecipeShortSerializer, ShoppingCartSerializer,
+                          IngredientSerializer, RecipeIdsSerializer,
+                          RecipeSerializer, RecipeShortSerializer,
                           SubscribeSerializer, TagSerializer,
                           UserCreateSerializer, UserSerializer)
 
 User = get_user_model()
 
+INSERT_ATTEMPTS = 3
 
-class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.annotate(
-        recipes_count=Count('recipes')
+
+def create_relation(model, **fields):
+    """Создаёт связь одним INSERT, дубликат отсекает ограничение уникальности.
+
+    Возвращает False, если такая связь уже есть.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        return False
+    return True
+
+
+def relation_columns(model):
+    ops = connection.ops
+    return (
+        ops.quote_name(model._meta.db_table),
+        ops.quote_name(model._meta.get_field('user').column),
+        ops.quote_name(model._meta.get_field('recipe').column),
     )
+
+
+def insert_relations(model, user_id, recipe_ids):
+    """Добавляет связи одним INSERT и возвращает id реально вставленных.
+
+    Существующие и параллельно вставленные связи пропускаются, поэтому
+    счётчики можно менять только по возвращённым id. Если рецепт успели
+    удалить, вставка откатывается до точки сохранения с IntegrityError:
+    внешние ключи проверяются сразу, а не при коммите.
+    """
+    if not recipe_ids:
+        return []
+    table, user_column, recipe_column = relation_columns(model)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            '{} {} ({}, {}) VALUES {}{} RETURNING {}'.format(
+                connection.ops.insert_statement(ignore_conflicts=True),
+                table,
+                user_column,
+                recipe_column,
+                ', '.join(['(%s, %s)'] * len(recipe_ids)),
+                connection.ops.ignore_conflicts_suffix_sql(
+                    ignore_conflicts=True
+                ),
+                recipe_column
+            ),
+            [
+                value for recipe_id in recipe_ids
+                for value in (user_id, recipe_id)
+            ]
+        )
+        added = [recipe_id for recipe_id, in cursor.fetchall()]
+        connection.check_constraints(table_names=[model._meta.db_table])
+        return added
+
+
+def delete_relations(model, user_id, recipe_ids):
+    """Удаляет связи одним DELETE без сигналов и возвращает id удалённых."""
+    table, user_column, recipe_column = relation_columns(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM {} WHERE {} = %s AND {} IN ({}) RETURNING {}'.format(
+                table,
+                user_column,
+                recipe_column,
+                ', '.join(['%s'] * len(recipe_ids)),
+                recipe_column
+            ),
+            [user_id, *recipe_ids]
+        )
+        return [recipe_id for recipe_id, in cursor.fetchall()]
+
+
+class UserViewSet(SubscribedAuthorsMixin, viewsets.ModelViewSet):
+    queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomPageNumberPagination
     lookup_field = 'id'
     filter_backends = [filters.SearchFilter]
     search_fields = ['username', 'email']
 
-    def get_queryset(self):
-        queryset = User.objects.all()
-        if self.action in ['subscriptions', 'subscribe']:
-            queryset = queryset.annotate(
-                recipes_count=Count('recipes')
-            )
-        return queryset
-
     def get_permissions(self):
         if self.action in ['create', 'list', 'retrieve']:
             self.permission_classes = [permissions.AllowAny]
@@ -58,8 +138,22 @@ class UserViewSet(viewsets.ModelViewSet):
             return SubscribeSerializer
         return UserSerializer
 
-    def get_serializer_context(self):
-        return {'request': self.request}
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit', '')
+        if recipes_limit.isdigit():
+            return int(recipes_limit)
+        return settings.PAGINATION_PAGE_SIZE
+
+    def get_subscribe_context(self, authors):
+        author_ids = [author.id for author in authors]
+        return {
+            'request': self.request,
+            'subscribed_ids': set(author_ids),
+            'recipes_by_author': Recipe.objects.latest_by_author(
+                author_ids,
+                self.get_recipes_limit()
+            ),
+        }
 
     @action(
         detail=False,
@@ -98,7 +192,8 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
         elif request.method == 'DELETE':
-            user.avatar.delete(save=True)
+            user.avatar = None
+            user.save(update_fields=['avatar'])
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -146,22 +241,14 @@ class UserViewSet(viewsets.ModelViewSet):
                     {'detail': 'Нельзя подписаться на самого себя.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            if Follow.objects.filter(user=user, author=author).exists():
+            if not create_relation(Follow, user=user, author=author):
                 return Response(
                     {'detail': 'Вы уже подписаны на этого пользователя.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-
-            data = {'user': user.id, 'author': author.id}
-            serializer = FollowSerializer(data=data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            author = User.objects.annotate(
-                recipes_count=Count('recipes')
-            ).get(id=author.id)
             response_serializer = SubscribeSerializer(
                 author,
-                context={'request': request}
+                context=self.get_subscribe_context([author])
             )
             return Response(
                 response_serializer.data,
@@ -192,46 +279,77 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        authors = User.objects.filter(following__user=user).annotate(
-            recipes_count=Count('recipes')
-        )
+        authors = User.objects.filter(following__user=user)
         page = self.paginate_queryset(authors)
 
         if page is not None:
             serializer = SubscribeSerializer(
                 page,
                 many=True,
-                context={'request': request}
+                context=self.get_subscribe_context(page)
             )
             return self.get_paginated_response(serializer.data)
 
         serializer = SubscribeSerializer(
             authors,
             many=True,
-            context={'request': request}
+            context=self.get_subscribe_context(authors)
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SubscribedAuthorsMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all().select_related(
         'author'
     ).prefetch_related(
         'tags',
-        'ingredients'
+        'ingredient_in_recipe__ingredient'
     )
     serializer_class = RecipeSerializer
+    author_field = 'author_id'
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
         IsOwnerOrAdminOrReadOnly
     ]
-    pagination_class = CustomPageNumberPagination
+    pagination_class = RecipePagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def feed(self, request):
+        paginator = CustomPageNumberPagination()
+        recipe_ids = paginator.paginate_queryset(
+            feed_recipe_ids(request.user.id), request, view=self
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        self.page_objects = [recipes[pk] for pk in recipe_ids if pk in recipes]
+        serializer = self.get_serializer(self.page_objects, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=['get'],
@@ -257,13 +375,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def add_to_shopping_cart(self, request, pk=None):
         recipe = get_object_or_404(Recipe, id=pk)
-
-        serializer = ShoppingCartSerializer(
-            data={'user': request.user.id, 'recipe': recipe.id},
-            context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if not create_relation(
+            ShoppingCart, user=request.user, recipe=recipe
+        ):
+            return Response(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Рецепт уже добавлен в корзину.'
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         recipe_serializer = RecipeShortSerializer(
             recipe, context={'request': request}
@@ -292,49 +414,77 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_204_NO_CONTENT
         )
 
-    def generate_shopping_list(self, user):
-        ingredients = (
-            Ingredient.objects.filter(
-                recipes__in_shopping_carts__user=user
-            ).values(
-                'name',
-                'measurement_unit'
-            ).annotate(
-                total_amount=Sum('ingredients_list__amount')
-            ).order_by('name')
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=[permissions.AllowAny]
+    )
+    def similar(self, request, pk=None):
+        similar_ids = list(
+            RecipeSimilarity.objects.filter(
+                recipe_id=pk
+            ).order_by('-score').values_list('similar_id', flat=True)
         )
+        if not similar_ids and not Recipe.objects.filter(id=pk).exists():
+            raise Http404
+        recipes = Recipe.objects.in_bulk(similar_ids)
+        serializer = RecipeShortSerializer(
+            [recipes[similar_id] for similar_id in similar_ids],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
 
-        if not ingredients.exists():
-            return None, 'Корзина покупок пуста.'
-
-        content = 'Список покупок:\n'
-        for ingredient in ingredients:
-            content += (
-                f'{ingredient["name"]} — {ingredient["total_amount"]} '
-                f'{ingredient["measurement_unit"]}\n'
-            )
-
-        buffer = BytesIO()
-        buffer.write(content.encode('utf-8'))
-        buffer.seek(0)
-        return buffer, None
+    def get_export_format(self, request):
+        # ?format= занят выбором рендерера DRF и на незнакомом значении
+        # отвечает 404 до вызова представления.
+        export_format = request.query_params.get('export', 'txt')
+        if export_format not in EXPORT_WRITERS:
+            export_format = 'txt'
+        return export_format
 
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[permissions.AllowAny]
+        permission_classes=[permissions.AllowAny],
+        renderer_classes=[JSONRenderer, PlainTextRenderer, CSVRenderer]
     )
     def download_shopping_cart(self, request):
-        buffer, error = self.generate_shopping_list(request.user)
-        if error:
+        rows = None
+        if request.user.is_authenticated:
+            rows = peek(shopping_list_rows(request.user))
+        if rows is None:
             return Response(
-                {'detail': error},
+                {'detail': 'Корзина покупок пуста.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        response = HttpResponse(buffer, content_type='text/plain')
+        export_format = self.get_export_format(request)
+        response = StreamingHttpResponse(
+            EXPORT_WRITERS[export_format](rows),
+            content_type=EXPORT_CONTENT_TYPES[export_format]
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.txt"'
+            f'attachment; filename="shopping_cart.{export_format}"'
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[AdministratorPermission],
+        renderer_classes=[JSONRenderer, PlainTextRenderer, CSVRenderer]
+    )
+    def download_all_shopping_carts(self, request):
+        response = StreamingHttpResponse(
+            iter_archive(
+                shopping_list_rows(),
+                self.get_export_format(request)
+            ),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="shopping_carts.zip"'
         )
         return response
 
@@ -345,10 +495,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk=None):
         recipe = get_object_or_404(Recipe, id=pk)
-        serializer = FavoriteSerializer(
-            data={'user': request.user.id, 'recipe': recipe.id})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        if not create_relation(Favorite, user=request.user, recipe=recipe):
+            return Response(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        'Рецепт уже добавлен в избарнное.'
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         recipe_serializer = RecipeShortSerializer(
             recipe, context={'request': request}
@@ -374,15 +529,117 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_204_NO_CONTENT
         )
 
+    def get_batch_recipe_ids(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['recipes']))
+
+    def add_batch(self, request, model, counter):
+        """Добавляет связи с рецептами пачкой и возвращает статусы по id."""
+        recipe_ids = self.get_batch_recipe_ids(request)
+        with transaction.atomic():
+            for attempt in range(INSERT_ATTEMPTS):
+                found = set(
+                    Recipe.objects.filter(
+                        id__in=recipe_ids
+                    ).values_list('id', flat=True)
+                )
+                try:
+                    added = insert_relations(
+                        model,
+                        request.user.id,
+                        [
+                            recipe_id for recipe_id in recipe_ids
+                            if recipe_id in found
+                        ]
+                    )
+                    break
+                except IntegrityError:
+                    # Рецепт удалили после выборки: повторяем без него.
+                    if attempt == INSERT_ATTEMPTS - 1:
+                        raise
+            change_counters(Recipe, added, counter, 1)
+            if model is ShoppingCart:
+                shopping_list.add_recipes(request.user.id, added)
+        added = set(added)
+        return {
+            recipe_id: (
+                'not_found' if recipe_id not in found
+                else 'added' if recipe_id in added
+                else 'exists'
+            )
+            for recipe_id in recipe_ids
+        }
+
+    def remove_batch(self, request, model, counter):
+        """Удаляет связи одним запросом и пересчитывает зависимые данные.
+
+        Сигналы удаления не отправляются, поэтому счётчики и список
+        покупок обновляются здесь одним изменением на всю пачку.
+        """
+        recipe_ids = self.get_batch_recipe_ids(request)
+        with transaction.atomic():
+            removed = delete_relations(model, request.user.id, recipe_ids)
+            change_counters(Recipe, removed, counter, -1)
+            if model is ShoppingCart:
+                shopping_list.remove_recipes(request.user.id, removed)
+        removed = set(removed)
+        return {
+            recipe_id: 'removed' if recipe_id in removed else 'not_found'
+            for recipe_id in recipe_ids
+        }
+
+    def batch_response(self, statuses):
+        return Response({
+            'results': [
+                {'id': recipe_id, 'status': recipe_status}
+                for recipe_id, recipe_status in statuses.items()
+            ]
+        })
 
-class TagViewSet(viewsets.ModelViewSet):
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='shopping_cart',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def add_many_to_shopping_cart(self, request):
+        return self.batch_response(
+            self.add_batch(request, ShoppingCart, 'carts_count')
+        )
+
+    @add_many_to_shopping_cart.mapping.delete
+    def remove_many_from_shopping_cart(self, request):
+        return self.batch_response(
+            self.remove_batch(request, ShoppingCart, 'carts_count')
+        )
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='favorite',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def add_many_to_favorites(self, request):
+        return self.batch_response(
+            self.add_batch(request, Favorite, 'favorites_count')
+        )
+
+    @add_many_to_favorites.mapping.delete
+    def remove_many_from_favorites(self, request):
+        return self.batch_response(
+            self.remove_batch(request, Favorite, 'favorites_count')
+        )
+
+
+class TagViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny, )
     http_method_names = ['get', 'head', 'options']
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     http_method_names = ['get', 'head', 'options']
@@ -390,6 +647,23 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        if set(request.query_params) == {'name'}:
+            return self.get_cached_response(request, self.list_by_prefix)
+        if set(request.query_params) == {'search'}:
+            return self.get_cached_response(request, self.list_by_similarity)
+        return super().list(request, *args, **kwargs)
+
+    def list_by_prefix(self, request):
+        return Response(
+            ingredient_prefix_index.search(request.query_params['name'])
+        )
+
+    def list_by_similarity(self, request):
+        return Response(
+            ingredient_trigram_index.search(request.query_params['search'])
+        )
+
 
 class FollowViewSet(viewsets.ModelViewSet):
     serializer_class = FollowSerializer
@@ -398,8 +672,6 @@ class FollowViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Follow.objects.filter(user=self.request.user).select_related(
             'author'
-        ).annotate(
-            recipes_count=Count('author__recipes')
         )
 
     def perform_create(self, serializer):
@@ -445,3 +717,28 @@ class FavoriteViewSet(viewsets.ModelViewSet):
                 {'status': 'Рецепт удален из избранного'},
                 status=status.HTTP_204_NO_CONTENT
             )
+
+
+@require_safe
+def resized_image(request, width, height, name):
+    """Отдаёт изображение рецепта в одном из разрешённых размеров."""
+    field = Recipe._meta.get_field('image')
+    if (
+        (width, height) not in settings.IMAGE_RESIZE_SIZES
+        or not name.startswith(field.upload_to)
+        or posixpath.normpath(name) != name
+        or not field.storage.exists(name)
+    ):
+        raise Http404
+    try:
+        path = resize_image(field.attr_class(None, field, name), width, height)
+    except OSError:
+        raise Http404
+    response = FileResponse(open(path, 'rb'))
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.IMAGE_RESIZE_CACHE_MAX_AGE,
+        immutable=True
+    )
+    return response
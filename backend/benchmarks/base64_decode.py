@@ -0,0 +1,104 @@
+"""Пиковое потребление памяти (RSS) при загрузке изображения в base64.
+
+Запуск из каталога backend:
+    python benchmarks/base64_decode.py --width 2400 --height 2400
+
+Каждый вариант декодирования выполняется в отдельном процессе, чтобы
+ru_maxrss не накапливался между замерами.
+"""
+import argparse
+import base64
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import uuid
+from io import BytesIO
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_django.settings')
+    import django
+    django.setup()
+
+
+def legacy_decode(data):
+    from django.core.files.base import ContentFile
+    from rest_framework import serializers
+
+    from api.images import normalize_image
+
+    format, imgstr = data.split(';base64,')
+    ext = format.split('/')[-1]
+    file = ContentFile(base64.b64decode(imgstr), name=f'{uuid.uuid4()}.{ext}')
+    file = serializers.ImageField().to_internal_value(file)
+    return normalize_image(file)
+
+
+def streaming_decode(data):
+    from api.fields import Base64ImageField
+
+    return Base64ImageField().to_internal_value(data)
+
+
+DECODERS = {
+    'legacy': legacy_decode,
+    'streaming': streaming_decode,
+}
+
+
+def measure(decoder, path):
+    setup_django()
+    with open(path) as file:
+        data = file.read()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    DECODERS[decoder](data)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(before, after)
+
+
+def make_payload(width, height):
+    from PIL import Image
+
+    image = Image.frombytes(
+        'RGB', (width, height), os.urandom(width * height * 3)
+    )
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=2000)
+    parser.add_argument('--measure', choices=DECODERS)
+    parser.add_argument('--payload')
+    args = parser.parse_args()
+    if args.measure:
+        return measure(args.measure, args.payload)
+
+    payload = make_payload(args.width, args.height)
+    with tempfile.NamedTemporaryFile('w', suffix='.b64') as file:
+        file.write(payload)
+        file.flush()
+        print(f'Размер payload: {len(payload) / 1024 / 1024:.1f} МиБ, '
+              f'{args.width}x{args.height}')
+        for decoder in DECODERS:
+            before, after = map(int, subprocess.check_output([
+                sys.executable, __file__,
+                '--measure', decoder, '--payload', file.name,
+            ]).split())
+            print(f'{decoder:>10}: пиковый RSS {after / 1024:.1f} МиБ, '
+                  f'прирост {(after - before) / 1024:.1f} МиБ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Бенчмарк горячих эндпоинтов API с бюджетами на время, запросы и память.
+
+Запуск из каталога backend:
+    python benchmarks/run.py             # сравнить с budgets.json
+    python benchmarks/run.py --update    # записать текущие значения в бюджет
+
+Для замеров создаётся тестовая база, которая заполняется командами
+load_ingredients и generate_data с фиксированным seed.
+
+Число запросов детерминировано и сверяется с бюджетом точно. Время
+(минимум из --repeat чередующихся прогонов) и память шумят на
+sub-миллисекундных замерах, поэтому к их бюджету добавляется
+абсолютный запас из slack.
+Время и память зависят от машины и версии Python, поэтому в CI
+проверяется только число запросов: --metrics queries.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BUDGETS_PATH = Path(__file__).resolve().parent / 'budgets.json'
+METRICS = ('time_ms', 'queries', 'memory_kb')
+DATASET = {'users': 200, 'recipes': 2000, 'seed': 20}
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_django.settings')
+    import django
+    django.setup()
+
+
+def create_database():
+    """Создаёт тестовую базу и возвращает имя исходной."""
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    settings.MEDIA_ROOT = tempfile.mkdtemp()
+    settings.IMAGE_RESIZE_ROOT = os.path.join(settings.MEDIA_ROOT, 'r')
+    # Версии кэшей проверяются раз в секунду, и такая проверка попадала
+    # бы в случайный замер: число запросов перестало бы быть точным.
+    settings.CATALOG_VERSION_CHECK_INTERVAL = float('inf')
+    settings.TOKEN_CACHE_CHECK_INTERVAL = float('inf')
+    setup_test_environment()
+    return connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def destroy_database(old_name):
+    from django.db import connection
+
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed():
+    from django.core.cache import caches
+    from django.core.management import call_command
+
+    for cache in caches.all():
+        cache.clear()
+    call_command('load_ingredients', stdout=StringIO())
+    call_command('generate_data', stdout=StringIO(), **DATASET)
+
+
+def build_cases():
+    """Возвращает пары (имя, функция запроса) для авторизованного клиента."""
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient
+
+    from recipe.models import Recipe, ShoppingCart, Tag
+
+    user = ShoppingCart.objects.order_by('user_id').first().user
+    recipe = Recipe.objects.exclude(
+        favorites__user=user
+    ).exclude(in_shopping_carts__user=user).order_by('id').first()
+    tag = Tag.objects.order_by('id').first()
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def get(url):
+        def request():
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return [response]
+        return request
+
+    def toggle(url):
+        def request():
+            return [client.post(url), client.delete(url)]
+        return request
+
+    return {
+        'recipes_list': get('/api/recipes/'),
+        'recipes_list_filtered': get(
+            f'/api/recipes/?tags={tag.slug}&author={recipe.author_id}'
+        ),
+        'recipes_list_favorited': get('/api/recipes/?is_favorited=1'),
+        'recipes_search': get('/api/recipes/?search=суп'),
+        'recipe_detail': get(f'/api/recipes/{recipe.id}/'),
+        'recipes_feed': get('/api/recipes/feed/'),
+        'users_list': get('/api/users/'),
+        'users_me': get('/api/users/me/'),
+        'subscriptions': get('/api/users/subscriptions/?recipes_limit=3'),
+        'ingredients_prefix': get('/api/ingredients/?name=мол'),
+        'ingredients_search': get('/api/ingredients/?search=молоко'),
+        'tags_list': get('/api/tags/'),
+        'download_shopping_cart': get('/api/recipes/download_shopping_cart/'),
+        'favorite_toggle': toggle(f'/api/recipes/{recipe.id}/favorite/'),
+        'shopping_cart_toggle': toggle(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        ),
+    }
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(request):
+    """Число запросов и пик памяти одного вызова после прогрева."""
+    from django.db import connection
+
+    for response in request():
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code}: {response.content}')
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        request()
+    tracemalloc.start()
+    request()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'queries': counter.count,
+        'memory_kb': round(peak / 1024, 1),
+    }
+
+
+def measure_time(cases, repeat):
+    """Минимальное время каждого кейса.
+
+    Прогоны кейсов чередуются, поэтому кратковременное замедление
+    машины задевает по одному прогону многих кейсов, а не все прогоны
+    одного.
+    """
+    timings = {name: [] for name in cases}
+    for _ in range(repeat):
+        for name, request in cases.items():
+            started = time.perf_counter()
+            request()
+            timings[name].append((time.perf_counter() - started) * 1000)
+    return {name: round(min(values), 2) for name, values in timings.items()}
+
+
+def compare(results, budgets, metrics=METRICS):
+    """Возвращает строки таблицы сравнения и признак регрессии."""
+    thresholds, slack = budgets['thresholds'], budgets['slack']
+    rows, failed = [], False
+    for case, actual_metrics in results.items():
+        budget = budgets['cases'].get(case)
+        for metric in metrics:
+            actual = actual_metrics[metric]
+            if budget is None:
+                rows.append((case, metric, '-', actual, '', 'NEW'))
+                continue
+            expected = budget[metric]
+            limit = expected * (1 + thresholds[metric]) + slack.get(metric, 0)
+            change = (actual - expected) / expected * 100 if expected else 0
+            status = 'FAIL' if actual > limit else 'ok'
+            failed = failed or status == 'FAIL'
+            rows.append(
+                (case, metric, expected, actual, f'{change:+.0f}%', status)
+            )
+    return rows, failed
+
+
+def print_table(rows):
+    header = ('case', 'metric', 'budget', 'actual', 'change', 'status')
+    rows = [header] + [tuple(map(str, row)) for row in rows]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        print('  '.join(
+            value.ljust(width) for value, width in zip(row, widths)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--update', action='store_true')
+    parser.add_argument(
+        '--metrics', nargs='+', choices=METRICS, default=METRICS,
+        help='Сравнивать с бюджетом только эти метрики'
+    )
+    parser.add_argument('cases', nargs='*', help='Запустить только эти кейсы')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        seed()
+        cases = {
+            name: request for name, request in build_cases().items()
+            if not args.cases or name in args.cases
+        }
+        results = {name: measure(request) for name, request in cases.items()}
+        for name, time_ms in measure_time(cases, args.repeat).items():
+            results[name] = {'time_ms': time_ms, **results[name]}
+    finally:
+        destroy_database(old_name)
+    budgets = json.loads(BUDGETS_PATH.read_text(encoding='utf-8'))
+    if args.update:
+        budgets['cases'].update(results)
+        BUDGETS_PATH.write_text(
+            json.dumps(budgets, ensure_ascii=False, indent=2) + '\n',
+            encoding='utf-8'
+        )
+        print(f'Бюджеты записаны в {BUDGETS_PATH}')
+        return 0
+    rows, failed = compare(results, budgets, args.metrics)
+    print_table(rows)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,6 +9,40 @@ PAGINATION_PAGE_SIZE = 6
 MIN_TIME_FOR_COOKING = 1
 MIN_INGREDIENTS_AMOUNT = 1
 MAX_INGREDIENTS_AMOUNT = 10000
+BATCH_MAX_RECIPES = 100
+FEED_TIMELINE_LENGTH = 500
+FEED_FANOUT_LIMIT = 1000
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+RECIPE_COUNT_CACHE_TIMEOUT = 30
+RECIPE_COUNT_ESTIMATE = os.getenv('RECIPE_COUNT_ESTIMATE', 'False') == 'True'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 20000))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 5000))
+STATE_CACHE_MAX_ENTRIES = 1000
+INGREDIENT_SEARCH_THRESHOLD = 0.3
+CATALOG_VERSION_CHECK_INTERVAL = 1
+INGREDIENT_SEARCH_LIMIT = 10
+IMAGE_MAX_SIZE = 2048
+IMAGE_QUALITY = 85
+IMAGE_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+IMAGE_MAX_PIXELS = 25_000_000
+IMAGE_ALLOWED_TYPES = ('jpeg', 'jpg', 'png', 'gif', 'webp')
+IMAGE_DECODE_CHUNK_SIZE = 256 * 1024
+IMAGE_SPOOL_SIZE = 1024 * 1024
+IMAGE_RESIZE_SIZES = ((160, 160), (320, 320), (640, 640), (960, 960))
+IMAGE_RESIZE_CACHE_MAX_SIZE = int(
+    os.getenv('IMAGE_RESIZE_CACHE_MAX_SIZE', 512 * 1024 * 1024)
+)
+IMAGE_RESIZE_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+IMAGE_RELEASE_GRACE = 60 * 60
+TOKEN_CACHE_TIMEOUT = 60 * 5
+TOKEN_CACHE_MAX_ENTRIES = 10000
+TOKEN_CACHE_CHECK_INTERVAL = 1
+IMAGE_VARIANTS = {
+    'small': (320, 320),
+    'medium': (640, 640),
+}
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -84,6 +118,36 @@ DATABASES = {
     }
 }
 
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'
+)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION')
+
+
+def cache_config(name, max_entries, timeout=300):
+    """Отдельное пространство кэша со своим лимитом записей.
+
+    По умолчанию это таблица в базе, общая для всех процессов; для
+    Memcached в CACHE_LOCATION указывается адрес сервера, а пространства
+    разделяются префиксом ключей.
+    """
+    return {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION or f'cache_{name}',
+        'KEY_PREFIX': name,
+        'TIMEOUT': timeout,
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+CACHES = {
+    'default': cache_config('default', CACHE_MAX_ENTRIES),
+    'catalog': cache_config(
+        'catalog', CATALOG_CACHE_MAX_ENTRIES, CATALOG_CACHE_TIMEOUT
+    ),
+    'state': cache_config('state', STATE_CACHE_MAX_ENTRIES, None),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,6 +180,7 @@ STATIC_ROOT = '/app/static'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media'
+IMAGE_RESIZE_ROOT = os.path.join(MEDIA_ROOT, 'r')
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -128,7 +193,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import posixpath
+import re
+import time
+from contextlib import contextmanager
+
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+
+ADDRESSED_NAME = re.compile(
+    r'(?:^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/(?P=a)(?P=b)[0-9a-f]{60}'
+)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем sha256 содержимого во вложенных каталогах.
+
+    Одинаковые файлы сохраняются один раз, поэтому удалять файл можно
+    только когда на него не ссылается ни одна запись. Повторное
+    сохранение обновляет время изменения файла, а сборщик мусора не
+    трогает недавно сохранённые файлы: ссылка на них может появиться
+    после коммита транзакции, которая их загрузила.
+    """
+
+    lock_name = '.content.lock'
+
+    def hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        digest = sha256.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], f'{digest}{extension}'
+        )
+
+    @contextmanager
+    def lock(self, exclusive=True):
+        """Блокировка между сохранением файлов и сборкой мусора."""
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, self.lock_name), 'a') as file:
+            locks.lock(file, locks.LOCK_EX if exclusive else locks.LOCK_SH)
+            try:
+                yield
+            finally:
+                locks.unlock(file)
+
+    def stored_since(self, name):
+        """Сколько секунд назад файл сохраняли последний раз."""
+        return time.time() - os.path.getmtime(self.path(name))
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаётся содержимым: если оно занято, такой файл уже
+        # сохранён, и подбирать другое имя нельзя.
+        if ADDRESSED_NAME.search(name) and self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def save(self, name, content, max_length=None):
+        try:
+            return super().save(name, content, max_length)
+        except FileExistsError:
+            if not ADDRESSED_NAME.search(name):
+                raise
+            return self._save(name, content)
+
+    def _save(self, name, content):
+        if not ADDRESSED_NAME.search(name):
+            name = self.hashed_name(name, content)
+        with self.lock(exclusive=False):
+            if self.exists(name):
+                os.utime(self.path(name))
+                return name
+            try:
+                return super()._save(name, content)
+            except FileExistsError:
+                if not self.exists(name):
+                    raise
+                return name
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    return content_storage
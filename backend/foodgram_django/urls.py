@@ -1,7 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from api.views import resized_image
+
 urlpatterns = [
     path('api/', include('api.urls')),
     path('admin/', admin.site.urls),
+    path(
+        'media/r/<int:width>x<int:height>/<path:name>',
+        resized_image,
+        name='resized-image'
+    ),
 ]
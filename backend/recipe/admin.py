@@ -36,7 +36,7 @@ class RecipeAdmin(admin.ModelAdmin):
     tags_list.short_description = 'Теги'
 
     def favorites_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
     favorites_count.short_description = 'Добавлено в избранное'
 
 
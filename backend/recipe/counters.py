@@ -0,0 +1,50 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import User
+
+from .models import Favorite, Follow, Recipe, ShoppingCart
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', ShoppingCart, 'recipe'),
+)
+
+
+def change_counter(model, pk, counter, delta):
+    change_counters(model, [pk], counter, delta)
+
+
+def change_counters(model, pks, counter, delta):
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{counter: Greatest(F(counter) + delta, 0)}
+        )
+
+
+def actual_count(related_model, field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def reconcile_counters():
+    """Пересчитывает счётчики и возвращает число исправленных строк."""
+    fixed = {}
+    for model, counter, related_model, field in COUNTERS:
+        actual = actual_count(related_model, field)
+        fixed[f'{model._meta.model_name}.{counter}'] = model.objects.annotate(
+            actual=actual
+        ).exclude(
+            **{counter: F('actual')}
+        ).update(**{counter: actual})
+    return fixed
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.images import collect_images
+
+
+class Command(BaseCommand):
+    help = 'Удаляет изображения, на которые не ссылается ни одна запись'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено изображений: {collect_images()}'
+        ))
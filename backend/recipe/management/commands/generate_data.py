@@ -0,0 +1,249 @@
+import random
+import time
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from PIL import Image
+
+from api.cache import RECIPE_COUNT_VERSION_KEY, bump_cache_version
+from api.feed import rebuild_feeds
+from api.images import generate_variants
+from recipe.counters import reconcile_counters
+from recipe.models import (Favorite, Follow, Ingredient, IngredientsInRecipe,
+                           Recipe, RecipeSearchTerm, ShoppingCart, Tag)
+from recipe.search import build_search_terms
+from recipe.shopping_list import rebuild_shopping_lists
+from users.models import User
+
+BATCH_SIZE = 5000
+POPULARITY_EXPONENT = 1.1
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+DISHES = (
+    'Салат', 'Суп', 'Рагу', 'Запеканка', 'Пирог', 'Паста', 'Омлет',
+    'Каша', 'Жаркое', 'Плов', 'Соус', 'Смузи',
+)
+STEPS = (
+    'Нарежьте ингредиенты.',
+    'Обжарьте на среднем огне до золотистого цвета.',
+    'Добавьте специи по вкусу.',
+    'Тушите под крышкой до готовности.',
+    'Запекайте в разогретой духовке.',
+    'Подавайте горячим.',
+    'Охладите перед подачей.',
+)
+
+
+class PowerLaw:
+    """Выбирает элементы с вероятностью, убывающей по степенному закону."""
+
+    def __init__(self, rng, population, exponent=POPULARITY_EXPONENT):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ))
+
+    def sample(self, k, exclude=None):
+        """Возвращает до k различных элементов."""
+        chosen = dict.fromkeys(self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=k
+        ))
+        chosen.pop(exclude, None)
+        return list(chosen)
+
+
+def next_id(model):
+    return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+
+def placeholder_image():
+    """Сохраняет общую заглушку для изображений сгенерированных рецептов."""
+    field = Recipe._meta.get_field('image')
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), (230, 220, 200)).save(buffer, 'JPEG')
+    name = field.storage.save(
+        f'{field.upload_to}placeholder.jpeg', ContentFile(buffer.getvalue())
+    )
+    generate_variants(field.attr_class(None, field, name))
+    return name
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями и рецептами'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients-per-recipe',
+            type=int,
+            default=8,
+            help='Среднее число ингредиентов в рецепте',
+        )
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'Каталог ингредиентов пуст, сначала выполните load_ingredients'
+            )
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.ingredients = PowerLaw(self.rng, ingredient_ids)
+        self.ingredient_names = dict(
+            Ingredient.objects.values_list('id', 'name')
+        )
+        for name, slug in DEFAULT_TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={'name': name})
+        self.tag_ids = list(
+            Tag.objects.order_by('id').values_list('id', flat=True)
+        )
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'], options['seed'])
+            recipe_ids = self.create_recipes(
+                options['recipes'],
+                PowerLaw(self.rng, user_ids),
+                options['ingredients_per_recipe']
+            )
+            self.create_relations(
+                Follow, 'author', user_ids,
+                PowerLaw(self.rng, user_ids), options['follows_per_user']
+            )
+            if recipe_ids:
+                recipes = PowerLaw(self.rng, recipe_ids)
+                self.create_relations(
+                    Favorite, 'recipe', user_ids,
+                    recipes, options['favorites_per_user']
+                )
+                self.create_relations(
+                    ShoppingCart, 'recipe', user_ids,
+                    recipes, options['carts_per_user']
+                )
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Recipe]
+                ):
+                    cursor.execute(sql)
+            self.stdout.write('Пересчёт счётчиков, списков покупок и лент')
+            reconcile_counters()
+            rebuild_shopping_lists()
+            rebuild_feeds()
+        bump_cache_version(RECIPE_COUNT_VERSION_KEY)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные сгенерированы за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def create_users(self, count, seed):
+        start = next_id(User)
+        password = make_password(None)
+        users = (
+            User(
+                id=start + index,
+                username=f'user{seed}_{start + index}',
+                email=f'user{seed}_{start + index}@example.com',
+                first_name=f'Имя{index}',
+                last_name=f'Фамилия{index}',
+                password=password,
+            )
+            for index in range(count)
+        )
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        self.stdout.write(f'Пользователей: {count}')
+        return list(range(start, start + count))
+
+    def create_recipes(self, count, authors, ingredients_per_recipe):
+        start = next_id(Recipe)
+        image = placeholder_image()
+        rows = 0
+        for offset in range(0, count, self.batch_size):
+            recipes, ingredients, tags = [], [], []
+            for recipe_id in range(
+                start + offset, start + min(offset + self.batch_size, count)
+            ):
+                recipe_ingredients = self.ingredients.sample(self.rng.randint(
+                    2, max(2, 2 * ingredients_per_recipe - 2)
+                ))
+                names = [
+                    self.ingredient_names[pk] for pk in recipe_ingredients
+                ]
+                recipes.append(Recipe(
+                    id=recipe_id,
+                    author_id=authors.sample(1)[0],
+                    name=f'{self.rng.choice(DISHES)} ({", ".join(names[:2])})',
+                    text=' '.join(
+                        [f'Понадобится: {", ".join(names)}.']
+                        + self.rng.sample(STEPS, 3)
+                    ),
+                    cooking_time=self.rng.randint(5, 180),
+                    image=image,
+                ))
+                ingredients.extend(
+                    IngredientsInRecipe(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.rng.randint(1, 500),
+                    )
+                    for ingredient_id in recipe_ingredients
+                )
+                tags.extend(
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for tag_id in self.rng.sample(
+                        self.tag_ids, self.rng.randint(1, len(self.tag_ids))
+                    )
+                )
+            Recipe.objects.bulk_create(recipes)
+            IngredientsInRecipe.objects.bulk_create(
+                ingredients, batch_size=self.batch_size
+            )
+            Recipe.tags.through.objects.bulk_create(tags)
+            RecipeSearchTerm.objects.bulk_create(
+                [
+                    term for recipe in recipes
+                    for term in build_search_terms(recipe)
+                ],
+                batch_size=self.batch_size
+            )
+            rows += len(ingredients)
+            self.stdout.write(
+                f'Рецептов: {offset + len(recipes)}, '
+                f'ингредиентов в рецептах: {rows}'
+            )
+        return list(range(start, start + count))
+
+    def create_relations(self, model, field, user_ids, targets, per_user):
+        count = 0
+        for offset in range(0, len(user_ids), self.batch_size):
+            relations = [
+                model(user_id=user_id, **{f'{field}_id': target_id})
+                for user_id in user_ids[offset:offset + self.batch_size]
+                for target_id in targets.sample(
+                    self.rng.randint(0, 2 * per_user),
+                    exclude=user_id if model is Follow else None
+                )
+            ]
+            model.objects.bulk_create(relations, ignore_conflicts=True)
+            count += len(relations)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {count}')
@@ -0,0 +1,116 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import (CATALOG_VERSION_KEY, bump_cache_version,
+                       is_cache_shared)
+from recipe.models import Ingredient
+
+BATCH_SIZE = 500
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if row:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            item = item.get('fields', item)
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := dict(islice(rows, size)):
+        yield batch
+
+
+def upsert_ingredients(batch):
+    """Создаёт новые ингредиенты и обновляет единицы измерения у старых."""
+    existing = {
+        ingredient.name: ingredient
+        for ingredient in Ingredient.objects.filter(name__in=batch)
+    }
+    changed = []
+    for name, measurement_unit in batch.items():
+        ingredient = existing.get(name)
+        if ingredient and ingredient.measurement_unit != measurement_unit:
+            ingredient.measurement_unit = measurement_unit
+            changed.append(ingredient)
+    Ingredient.objects.bulk_create(
+        [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in batch.items()
+            if name not in existing
+        ],
+        ignore_conflicts=True
+    )
+    Ingredient.objects.bulk_update(changed, ['measurement_unit'])
+    # С ignore_conflicts bulk_create возвращает все переданные объекты,
+    # включая пропущенные, поэтому новые строки считаются по базе.
+    created = Ingredient.objects.filter(name__in=batch).count()
+    return created - len(existing), len(changed)
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=settings.BASE_DIR / 'data' / 'ingredients.csv',
+            help='Путь к файлу (по умолчанию: data/ingredients.csv)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Размер пачки (по умолчанию: {BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **kwargs):
+        path = Path(kwargs['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден. Проверьте путь.')
+
+        started = time.perf_counter()
+        total = created = updated = 0
+        with transaction.atomic():
+            for batch in batches(reader(path), kwargs['batch_size']):
+                batch_created, batch_updated = upsert_ingredients(batch)
+                total += len(batch)
+                created += batch_created
+                updated += batch_updated
+        if created or updated:
+            bump_cache_version(CATALOG_VERSION_KEY)
+            if not is_cache_shared():
+                self.stderr.write(
+                    'Кэш не общий для процессов: перезапустите приложение, '
+                    'чтобы оно увидело обновлённый справочник'
+                )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано {total} строк за {elapsed:.2f} с '
+            f'({total / elapsed:.0f} строк/с): добавлено {created}, '
+            f'обновлено {updated}'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Собирает ленты подписок заново'
+
+    def handle(self, *args, **kwargs):
+        rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS('Ленты подписок перестроены'))
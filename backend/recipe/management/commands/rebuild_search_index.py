@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipe.models import Recipe, RecipeSearchTerm
+from recipe.search import build_search_terms
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс рецептов'
+
+    def handle(self, *args, **kwargs):
+        terms = []
+        with transaction.atomic():
+            RecipeSearchTerm.objects.all().delete()
+            for recipe in Recipe.objects.only('id', 'name', 'text').iterator():
+                terms.extend(build_search_terms(recipe))
+                if len(terms) >= BATCH_SIZE:
+                    RecipeSearchTerm.objects.bulk_create(terms)
+                    terms = []
+            RecipeSearchTerm.objects.bulk_create(terms)
+        self.stdout.write(self.style.SUCCESS(
+            'Поисковый индекс рецептов перестроен'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipe.similarity import rebuild_similarities
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты для всего каталога'
+
+    def handle(self, *args, **kwargs):
+        rebuild_similarities()
+        self.stdout.write(self.style.SUCCESS('Похожие рецепты пересчитаны'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipe.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с реальными данными'
+
+    def handle(self, *args, **kwargs):
+        for counter, fixed in reconcile_counters().items():
+            self.stdout.write(f'{counter}: исправлено строк — {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe.similarity import process_refresh_queue
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты для изменённых рецептов из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Повторять каждые N секунд; без него — один проход',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = process_refresh_queue()
+            if refreshed:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Обновлены похожие для {refreshed} рецептов'
+                ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0012_alter_recipe_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64, verbose_name='Терм')),
+                ('weight', models.PositiveIntegerField(verbose_name='Вес')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='recipe.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Терм поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipesearchterm',
+            constraint=models.UniqueConstraint(fields=('recipe', 'term'), name='unique_recipe_search_term'),
+        ),
+    ]
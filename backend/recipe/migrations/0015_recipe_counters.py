@@ -0,0 +1,56 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Follow = apps.get_model('recipe', 'Follow')
+    Favorite = apps.get_model('recipe', 'Favorite')
+    ShoppingCart = apps.get_model('recipe', 'ShoppingCart')
+    User.objects.update(
+        recipes_count=count_subquery(Recipe, 'author'),
+        followers_count=count_subquery(Follow, 'author')
+    )
+    Recipe.objects.update(
+        favorites_count=count_subquery(Favorite, 'recipe'),
+        carts_count=count_subquery(ShoppingCart, 'recipe')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0014_shoppinglistitem'),
+        ('users', '0009_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлено в корзины'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Добавлено в избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:03
+
+from django.db import migrations, models
+import foodgram_django.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0015_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=foodgram_django.storage.get_content_storage, upload_to='media/', verbose_name='Изображение рецепта'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0017_recipesimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.PositiveIntegerField(verbose_name='id рецепта')),
+            ],
+            options={
+                'verbose_name': 'Рецепт в очереди пересчёта похожих',
+                'verbose_name_plural': 'Очередь пересчёта похожих рецептов',
+            },
+        ),
+    ]
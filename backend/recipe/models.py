@@ -1,12 +1,44 @@
+from collections import defaultdict
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 
+from foodgram_django.storage import get_content_storage
 from users.models import User
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def latest_by_author(self, author_ids, limit):
+        """Возвращает до limit новых рецептов каждого автора одним запросом."""
+        recipes_by_author = defaultdict(list)
+        if not author_ids:
+            return recipes_by_author
+        ranked = self.filter(author_id__in=author_ids).order_by().annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_date').desc(), F('id').desc()]
+            )
+        )
+        sql, params = ranked.query.sql_with_params()
+        recipes = self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked_recipes '
+            'WHERE recipe_rank <= %s ORDER BY author_id, recipe_rank',
+            (*params, limit)
+        )
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
+
+
 class Recipe(models.Model):
+    COUNTER_FIELDS = ('favorites_count', 'carts_count')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -19,6 +51,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='media/',
+        storage=get_content_storage,
+        db_index=True,
         verbose_name='Изображение рецепта'
     )
     text = models.TextField(
@@ -49,11 +83,30 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата создания'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлено в избранное'
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлено в корзины'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', 'id')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -219,3 +272,145 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.recipe} в в корзине у - {self.user}'
+
+
+class RecipeSearchTerm(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Рецепт'
+    )
+    term = models.CharField(
+        max_length=64,
+        db_index=True,
+        verbose_name='Терм'
+    )
+    weight = models.PositiveIntegerField(
+        verbose_name='Вес'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=['recipe', 'term'],
+                name='unique_recipe_search_term'
+            ),
+        )
+        verbose_name = 'Терм поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+
+    def __str__(self):
+        return f'{self.term} - {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            ),
+        )
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок у - {self.user}'
+
+
+class RecipeSimilarity(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similarity'
+            ),
+        )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} - {self.similar}'
+
+
+class SimilarityRefresh(models.Model):
+    recipe_id = models.PositiveIntegerField(
+        verbose_name='id рецепта'
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в очереди пересчёта похожих'
+        verbose_name_plural = 'Очередь пересчёта похожих рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата создания рецепта'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_order'
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.recipe} в ленте у - {self.user}'
@@ -0,0 +1,146 @@
+import re
+from collections import Counter
+
+from django.db import transaction
+
+VOWELS = 'аеиоуыэюя'
+STOP_WORDS = frozenset(
+    'а без в во да для до же за и из или к ко как на над не ни но о об '
+    'от по под при про с со так то у что это'.split()
+)
+NAME_WEIGHT = 3
+TEXT_WEIGHT = 1
+TERM_MAX_LENGTH = 64
+TOKEN_RE = re.compile(r'[^\W_]+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+
+def _endings(preceded='', plain=''):
+    endings = [(ending, True) for ending in preceded.split()]
+    endings += [(ending, False) for ending in plain.split()]
+    return sorted(endings, key=lambda item: -len(item[0]))
+
+
+PERFECTIVE_GERUND = _endings(
+    'в вши вшись',
+    'ив ивши ившись ыв ывши ывшись'
+)
+ADJECTIVE = _endings(
+    plain='ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому '
+          'их ых ую юю ая яя ою ею'
+)
+PARTICIPLE = _endings('ем нн вш ющ щ', 'ивш ывш ующ')
+REFLEXIVE = _endings(plain='ся сь')
+VERB = _endings(
+    'ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно',
+    'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено '
+    'ят ует уют ит ыт ены ить ыть ишь ую ю'
+)
+NOUN = _endings(
+    plain='а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием '
+          'ем ам ом о у ах иях ях ы ь ию ью ю ия ья я'
+)
+DERIVATIONAL = _endings(plain='ост ость')
+SUPERLATIVE = _endings(plain='ейш ейше')
+
+
+def _strip(word, endings):
+    for ending, preceded in endings:
+        if word.endswith(ending):
+            base = word[:-len(ending)]
+            if not preceded or base.endswith(('а', 'я')):
+                return base
+    return None
+
+
+def _region_start(word, start):
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip_adjectival(word):
+    base = _strip(word, ADJECTIVE)
+    if base is None:
+        return None
+    participle_base = _strip(base, PARTICIPLE)
+    return base if participle_base is None else participle_base
+
+
+def stem(word):
+    """Стеммер Портера (Snowball) для русского языка."""
+    word = word.replace('ё', 'е')
+    rv_start = next(
+        (i + 1 for i, letter in enumerate(word) if letter in VOWELS),
+        len(word)
+    )
+    r2_start = _region_start(word, _region_start(word, 0))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    base = _strip(rv, PERFECTIVE_GERUND)
+    if base is None:
+        reflexive_base = _strip(rv, REFLEXIVE)
+        if reflexive_base is not None:
+            rv = reflexive_base
+        for strip in (
+            _strip_adjectival,
+            lambda value: _strip(value, VERB),
+            lambda value: _strip(value, NOUN),
+        ):
+            base = strip(rv)
+            if base is not None:
+                break
+    if base is not None:
+        rv = base
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    base = _strip(rv, DERIVATIONAL)
+    if base is not None and rv_start + len(base) >= r2_start:
+        rv = base
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        base = _strip(rv, SUPERLATIVE)
+        if base is not None:
+            rv = base[:-1] if base.endswith('нн') else base
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def search_terms(text):
+    """Разбивает текст на нормализованные термы поискового индекса."""
+    terms = []
+    for token in TOKEN_RE.findall(text.casefold()):
+        if token in STOP_WORDS or len(token) < 2:
+            continue
+        if CYRILLIC_RE.search(token):
+            token = stem(token)
+        terms.append(token[:TERM_MAX_LENGTH])
+    return terms
+
+
+def build_search_terms(recipe):
+    from .models import RecipeSearchTerm
+
+    weights = Counter()
+    for term in search_terms(recipe.name):
+        weights[term] += NAME_WEIGHT
+    for term in search_terms(recipe.text):
+        weights[term] += TEXT_WEIGHT
+    return [
+        RecipeSearchTerm(recipe=recipe, term=term, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index_recipe(recipe):
+    from .models import RecipeSearchTerm
+
+    with transaction.atomic():
+        RecipeSearchTerm.objects.filter(recipe=recipe).delete()
+        RecipeSearchTerm.objects.bulk_create(build_search_terms(recipe))
@@ -0,0 +1,147 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+
+from .models import IngredientsInRecipe, ShoppingCart, ShoppingListItem
+
+APPLY_ATTEMPTS = 3
+
+
+def recipe_amounts(recipe_id):
+    return dict(
+        IngredientsInRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'amount')
+    )
+
+
+def apply_deltas(user_ids, deltas):
+    """Изменяет суммы ингредиентов в списках покупок пользователей.
+
+    deltas — словарь {id ингредиента: изменение количества}.
+    select_for_update не блокирует ещё не созданные позиции, поэтому
+    при конфликте с параллельной вставкой изменение повторяется.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    for attempt in range(APPLY_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                write_deltas(user_ids, deltas)
+            return
+        except IntegrityError:
+            if attempt == APPLY_ATTEMPTS - 1:
+                raise
+
+
+def write_deltas(user_ids, deltas):
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.select_for_update().filter(
+            user_id__in=user_ids,
+            ingredient_id__in=deltas
+        )
+    }
+    added = []
+    changed = []
+    removed = []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    added.append(ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=delta
+                    ))
+                continue
+            item.amount += delta
+            if item.amount > 0:
+                changed.append(item)
+            else:
+                removed.append(item.id)
+    if removed:
+        ShoppingListItem.objects.filter(id__in=removed).delete()
+    ShoppingListItem.objects.bulk_update(changed, ['amount'])
+    ShoppingListItem.objects.bulk_create(added)
+
+
+def add_recipe(user_id, recipe_id):
+    apply_deltas([user_id], recipe_amounts(recipe_id))
+
+
+def recipes_amounts(recipe_ids):
+    return dict(
+        IngredientsInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient_id').annotate(
+            total=Sum('amount')
+        ).values_list('ingredient_id', 'total')
+    )
+
+
+def add_recipes(user_id, recipe_ids):
+    """Добавляет в список покупок сразу несколько рецептов."""
+    if recipe_ids:
+        apply_deltas([user_id], recipes_amounts(recipe_ids))
+
+
+def remove_recipe(user_id, recipe_id):
+    apply_deltas([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def remove_recipes(user_id, recipe_ids):
+    """Убирает из списка покупок сразу несколько рецептов."""
+    if recipe_ids:
+        apply_deltas([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipes_amounts(recipe_ids).items()
+        })
+
+
+def change_recipe(recipe_id, deltas):
+    apply_deltas(
+        list(ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)),
+        deltas
+    )
+
+
+def rebuild_shopping_lists(user_ids=None):
+    """Пересчитывает списки покупок из корзин с нуля."""
+    carts = ShoppingCart.objects.all()
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+        items = items.filter(user_id__in=user_ids)
+    totals = defaultdict(int)
+    for user_id, ingredient_id, amount in carts.values_list(
+        'user_id',
+        'recipe__ingredient_in_recipe__ingredient_id'
+    ).annotate(
+        amount=Sum('recipe__ingredient_in_recipe__amount')
+    ).filter(amount__isnull=False):
+        totals[user_id, ingredient_id] += amount
+    with transaction.atomic():
+        items.delete()
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for (user_id, ingredient_id), amount in totals.items()
+            ],
+            batch_size=1000
+        )
@@ -0,0 +1,187 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from scipy import sparse
+
+from .models import (IngredientsInRecipe, Recipe, RecipeSimilarity,
+                     SimilarityRefresh)
+
+BATCH_SIZE = 256
+WRITE_BATCH_SIZE = 5000
+
+
+def feature_pairs(ingredients, tags):
+    """Пары (id рецепта, признак) и их веса.
+
+    Признак ингредиента — 2 * id, тега — 2 * id + 1.
+    """
+    ingredient_pairs = np.array(
+        list(ingredients.values_list('recipe_id', 'ingredient_id')),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    tag_pairs = np.array(
+        list(tags.values_list('recipe_id', 'tag_id')),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    recipe_ids = np.concatenate([ingredient_pairs[:, 0], tag_pairs[:, 0]])
+    features = np.concatenate([
+        2 * ingredient_pairs[:, 1], 2 * tag_pairs[:, 1] + 1
+    ])
+    weights = np.concatenate([
+        np.ones(len(ingredient_pairs)),
+        np.full(len(tag_pairs), settings.SIMILAR_RECIPES_TAG_WEIGHT)
+    ])
+    return recipe_ids, features, weights
+
+
+def idf(document_frequency, total):
+    return np.log((1 + total) / (1 + document_frequency)) + 1
+
+
+def tfidf_matrix(recipe_ids, features, weights):
+    """Строит нормированную матрицу рецепт x признак с весами TF-IDF."""
+    recipes, rows = np.unique(recipe_ids, return_inverse=True)
+    columns_features, columns = np.unique(features, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (weights, (rows, columns)),
+        shape=(len(recipes), len(columns_features))
+    )
+    frequency = np.bincount(columns, minlength=len(columns_features))
+    matrix = matrix @ sparse.diags(idf(frequency, len(recipes)))
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return recipes, (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def catalog_matrix():
+    return tfidf_matrix(*feature_pairs(
+        IngredientsInRecipe.objects.all(),
+        Recipe.tags.through.objects.all()
+    ))
+
+
+def top_neighbours(columns, scores, limit):
+    if len(scores) > limit:
+        top = np.argpartition(-scores, limit)[:limit]
+        columns, scores = columns[top], scores[top]
+    return columns, scores
+
+
+def nearest(recipes, matrix, rows):
+    """Топ похожих для строк матрицы: (id, id похожих, оценки)."""
+    transposed = matrix.T.tocsr()
+    limit = settings.SIMILAR_RECIPES_COUNT
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        scores = (matrix[batch] @ transposed).tocsr()
+        for index, row in enumerate(batch):
+            begin, end = scores.indptr[index], scores.indptr[index + 1]
+            columns = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            keep = (columns != row) & (values > 0)
+            columns, values = top_neighbours(
+                columns[keep], values[keep], limit
+            )
+            yield recipes[row], recipes[columns], values
+
+
+def save_similarities(similarities, recipe_ids=None):
+    """Заменяет списки похожих рецептов recipe_ids, по умолчанию все."""
+    with transaction.atomic():
+        stale = RecipeSimilarity.objects.all()
+        if recipe_ids is not None:
+            stale = stale.filter(recipe_id__in=recipe_ids)
+        stale.delete()
+        batch = []
+        for recipe_id, similar_ids, scores in similarities:
+            batch.extend(
+                RecipeSimilarity(
+                    recipe_id=recipe_id,
+                    similar_id=similar_id,
+                    score=score
+                )
+                for similar_id, score in zip(
+                    similar_ids.tolist(), scores.tolist()
+                )
+            )
+            if len(batch) >= WRITE_BATCH_SIZE:
+                RecipeSimilarity.objects.bulk_create(batch)
+                batch = []
+        RecipeSimilarity.objects.bulk_create(batch)
+
+
+def rebuild_similarities():
+    """Пересчитывает похожие рецепты для всего каталога."""
+    recipes, matrix = catalog_matrix()
+    save_similarities(nearest(recipes, matrix, np.arange(len(recipes))))
+
+
+def affected_recipes(recipes, matrix, recipe_ids):
+    """Рецепты, чьи списки похожих могли измениться вместе с recipe_ids.
+
+    Это сами рецепты, списки, где они уже есть, и списки, в которые они
+    теперь попадают: неполные или с минимальной оценкой ниже новой.
+    """
+    affected = set(recipe_ids)
+    affected.update(RecipeSimilarity.objects.filter(
+        similar_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    rows = np.flatnonzero(np.isin(recipes, list(recipe_ids)))
+    if not len(rows):
+        return affected
+    best = (matrix @ matrix[rows].T).max(axis=1).toarray().ravel()
+    totals = np.zeros(len(recipes))
+    lowest = np.zeros(len(recipes))
+    for recipe_id, total, score in RecipeSimilarity.objects.values(
+        'recipe_id'
+    ).annotate(
+        total=Count('id'),
+        lowest=Min('score')
+    ).values_list('recipe_id', 'total', 'lowest'):
+        row = np.searchsorted(recipes, recipe_id)
+        if row < len(recipes) and recipes[row] == recipe_id:
+            totals[row], lowest[row] = total, score
+    entering = (best > 0) & (
+        (totals < settings.SIMILAR_RECIPES_COUNT) | (best > lowest)
+    )
+    affected.update(recipes[entering].tolist())
+    return affected
+
+
+def refresh_similarities(recipe_ids):
+    """Пересчитывает списки похожих, затронутые изменением recipe_ids.
+
+    Затронутые списки считаются заново целиком, поэтому выбывшие
+    соседи замещаются следующими по сходству. Частоты признаков берутся
+    по текущему каталогу; их дрейф в остальных списках выравнивает
+    полный пересчёт rebuild_similar_recipes.
+    """
+    recipes, matrix = catalog_matrix()
+    affected = affected_recipes(recipes, matrix, recipe_ids)
+    rows = np.flatnonzero(np.isin(recipes, list(affected)))
+    save_similarities(nearest(recipes, matrix, rows), affected)
+    return len(affected)
+
+
+def queue_refresh(recipe_ids):
+    SimilarityRefresh.objects.bulk_create(
+        SimilarityRefresh(recipe_id=recipe_id) for recipe_id in recipe_ids
+    )
+
+
+def process_refresh_queue():
+    """Обрабатывает накопленную очередь и возвращает число рецептов.
+
+    Записи, добавленные во время пересчёта, остаются до следующего раза.
+    """
+    last_id = SimilarityRefresh.objects.aggregate(
+        last_id=Max('id')
+    )['last_id']
+    if last_id is None:
+        return 0
+    queued = SimilarityRefresh.objects.filter(id__lte=last_id)
+    recipe_ids = set(queued.values_list('recipe_id', flat=True))
+    refreshed = refresh_similarities(recipe_ids)
+    queued.delete()
+    return refreshed
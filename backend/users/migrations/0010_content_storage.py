@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:03
+
+from django.db import migrations, models
+import foodgram_django.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, db_index=True, default='/static/static/media/userpic-icon.jpg', null=True, storage=foodgram_django.storage.get_content_storage, upload_to='users/avatars/'),
+        ),
+    ]
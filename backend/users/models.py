@@ -4,6 +4,8 @@ from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db import models
 
+from foodgram_django.storage import get_content_storage
+
 
 class User(AbstractUser):
 
@@ -15,6 +17,8 @@ class User(AbstractUser):
         (ROLE_USER, 'User'),
     )
 
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
         'username',
@@ -57,6 +61,8 @@ class User(AbstractUser):
     )
     avatar = models.ImageField(
         upload_to='users/avatars/',
+        storage=get_content_storage,
+        db_index=True,
         blank=True,
         null=True,
         default=f'{settings.STATIC_URL}static/media/userpic-icon.jpg',
@@ -65,6 +71,14 @@ class User(AbstractUser):
         verbose_name='Подписка',
         default=False,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+    )
 
     class Meta:
         verbose_name = 'пользователь'
@@ -86,6 +100,12 @@ class User(AbstractUser):
     def save(self, *args, **kwargs):
         if self.is_superuser:
             self.role = self.ROLE_ADMIN
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
         return super().save(*args, **kwargs)
 
     def __str__(self):